@@ -8,4 +8,5 @@ import builtins
 import sys
 
 # Create alias: __builtin__ -> builtins (Python 2 -> Python 3 compatibility)
-sys.modules["__builtin__"] = builtins
+if sys.version_info[0] >= 3:
+    sys.modules["__builtin__"] = builtins
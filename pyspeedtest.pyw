@@ -12,6 +12,7 @@ import tkinter as tk
 from tkinter import messagebox
 import customtkinter as ctk
 import threading
+import logging
 import csv
 import os
 import re
@@ -867,6 +868,7 @@ class PyNetSpeedMonitorModern:
                     if self.supabase_manager.save_test_result(
                         self.test_results, embedding
                     ):
+                        self.rag_analyzer.remember_test(self.test_results, embedding)
                         print(
                             "✅ Saved to Supabase speedtest_history with embedding (for RAG)"
                         )
@@ -1583,6 +1585,11 @@ Atau tanya apa saja tentang jaringan! 😊"""
 # ==================== MAIN ====================
 
 if __name__ == "__main__":
+    # Show database status messages on the console, like the other prints;
+    # other libraries (e.g. httpx request lines) stay at WARNING
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logging.getLogger("supabase_manager").setLevel(logging.INFO)
+
     root = ctk.CTk()
     app = PyNetSpeedMonitorModern(root)
     root.mainloop()
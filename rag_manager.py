@@ -3,10 +3,396 @@ Mistral AI RAG Analyzer
 Manages Mistral AI API integration and RAG operations for speedtest analysis
 """
 
-from mistralai import Mistral
-from typing import List, Dict, Optional
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable, Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from operator import itemgetter
+import numpy as np
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sqlite3
+import threading
 import time
 
+# Use orjson for cache and vector parsing when available (much faster on floats)
+try:
+    import orjson
+
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
+# Persistent cache location for embeddings and chat completions
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "py-speedtest")
+
+
+# Quality thresholds per label: (max ping, max jitter, min download, min upload)
+QUALITY_LABELS = np.array(["Excellent", "Good", "Fair", "Poor"])
+QUALITY_THRESHOLDS = np.array(
+    [
+        [20, 5, 50, 20],
+        [50, 10, 25, 10],
+        [100, 20, 10, 5],
+    ],
+    dtype=float,
+)
+# Columns where a higher value is better (download, upload)
+QUALITY_HIGHER_IS_BETTER = np.array([False, False, True, True])
+
+# Embedding API retries (attempts, base backoff in seconds)
+EMBED_RETRIES = 3
+EMBED_BACKOFF = 0.5
+
+# History size below which similarity search runs in-process
+HOT_CACHE_LIMIT = 1000
+
+# Minimum cosine similarity for a history test to count as similar (both the
+# local search and the match_speedtest_history RPC apply it)
+MATCH_THRESHOLD = 0.7
+
+# System prompt for build_analysis_prompt (static, sent as the system message)
+ANALYSIS_SYSTEM_PROMPT = """Kamu adalah seorang ahli analisis performa jaringan internet. Analisis hasil speedtest dari user dan berikan insight yang mudah dipahami dalam Bahasa Indonesia.
+
+Data dikirim dalam format ringkas:
+- CURRENT: hasil test saat ini (ts=waktu, ping & jitter dalam ms, dl & ul dalam Mbps)
+- HIST: test historis yang mirip, satu baris per test dengan kolom di baris header
+- STATS: statistik seluruh history (n=jumlah test, avg=rata-rata, max/min=terbaik)
+
+Berikan analisis yang komprehensif dengan gaya bahasa yang santai dan mudah dipahami, seperti sedang berbicara dengan teman. Gunakan format berikut:
+
+1. **Penilaian Performa**: Beri rating kualitas internet saat ini (Sangat Bagus/Bagus/Cukup/Kurang Bagus) dan jelaskan alasannya dengan bahasa yang mudah dimengerti.
+
+2. **Analisis Tren**: Bandingkan hasil sekarang dengan data historis. Apakah internet makin cepat, makin lambat, atau stabil? Jelaskan dengan contoh konkret.
+
+3. **Deteksi Anomali**: Cari pola yang tidak biasa atau aneh dari hasil test ini dibanding biasanya. Misalnya ping tiba-tiba tinggi atau download speed turun drastis.
+
+4. **Analisis Penyebab**: Berdasarkan data yang ada, jelaskan kemungkinan penyebab performa saat ini. Contoh: "Sepertinya jaringan lagi rame nih" atau "Koneksi ke server jauh jadi ping-nya tinggi".
+
+5. **Rekomendasi**: Berikan 3-5 saran praktis yang bisa langsung dilakukan untuk meningkatkan kualitas internet. Gunakan bahasa sehari-hari yang gampang dipahami.
+
+Penting: Gunakan bahasa Indonesia yang natural, santai, dan mudah dipahami. Hindari istilah teknis yang terlalu rumit. Jika harus pakai istilah teknis, jelaskan artinya dengan bahasa sederhana."""
+
+# Compact data rows for the user message of build_analysis_prompt
+CURRENT_TEST_TEMPLATE = (
+    "CURRENT: ts={timestamp},isp={isp},server={server},"
+    "ping={ping},jitter={jitter},dl={download},ul={upload}\n"
+)
+CURRENT_TEST_DEFAULTS = {
+    "timestamp": "Unknown",
+    "isp": "Unknown",
+    "server": "Unknown",
+    "ping": 0,
+    "jitter": 0,
+    "download": 0,
+    "upload": 0,
+}
+CURRENT_TEST_FIELDS = itemgetter(
+    "timestamp", "isp", "server", "ping", "jitter", "download", "upload"
+)
+
+SIMILAR_TESTS_HEADER = "HIST:\nno,ts,isp,server,ping,jitter,dl,ul\n"
+SIMILAR_TEST_TEMPLATE = (
+    "{index},{timestamp},{isp},{server_name},"
+    "{ping_ms},{jitter_ms},{download_mbps},{upload_mbps}\n"
+)
+SIMILAR_TEST_DEFAULTS = {
+    "timestamp": "Unknown",
+    "isp": "Unknown",
+    "server_name": "Unknown",
+    "ping_ms": 0,
+    "jitter_ms": 0,
+    "download_mbps": 0,
+    "upload_mbps": 0,
+}
+
+STATS_TEMPLATE = (
+    "STATS: n={count},avg_ping={avg_ping:.1f},avg_jitter={avg_jitter:.1f},"
+    "avg_dl={avg_download:.2f},avg_ul={avg_upload:.2f},"
+    "max_dl={max_download:.2f},max_ul={max_upload:.2f},min_ping={min_ping:.1f}\n"
+)
+STATS_DEFAULTS = {
+    "count": 0,
+    "avg_ping": 0,
+    "avg_jitter": 0,
+    "avg_download": 0,
+    "avg_upload": 0,
+    "max_download": 0,
+    "max_upload": 0,
+    "min_ping": 0,
+}
+
+# Section headers recognised by parse_ai_response (Indonesian & English).
+# A header line is any line mentioning one of the section names.
+SECTION_RE = re.compile(
+    r"^.*?(?:"
+    r"(?P<performance>penilaian performa|performance assessment)"
+    r"|(?P<trend>analisis tren|trend analysis)"
+    r"|(?P<anomaly>deteksi anomali|anomaly detection)"
+    r"|(?P<root_cause>analisis penyebab|root cause)"
+    r"|(?P<recommendations>rekomendasi|recommendation)"
+    r").*(?:\n|$)",
+    re.IGNORECASE | re.MULTILINE,
+)
+SECTION_KEYS = {
+    "performance": "performance_assessment",
+    "trend": "trend_analysis",
+    "anomaly": "anomaly_detection",
+    "root_cause": "root_cause_analysis",
+    "recommendations": "recommendations",
+}
+RECOMMENDATION_RE = re.compile(r"^[ \t]*((?:[-•*]|[1-5]\.).*?)\s*$", re.MULTILINE)
+BLANK_LINE_RE = re.compile(r"^\s*?(?:\n|\Z)", re.MULTILINE)
+
+
+# Optional numba kernel for int8 dot products (LLVM emits VNNI where available).
+# numba itself is imported and the kernel compiled on first use, which
+# _load_hot_cache triggers off the event loop; without numba the hot cache
+# stays float32 and is scored with a BLAS matrix-vector product instead.
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+numba = None
+_int8_dot_kernel = None
+
+if HAS_NUMBA:
+
+    def _int8_dot_py(matrix, q):
+        out = np.empty(matrix.shape[0], dtype=np.int32)
+        for i in numba.prange(matrix.shape[0]):
+            total = 0
+            for d in range(matrix.shape[1]):
+                total += np.int32(matrix[i, d]) * np.int32(q[d])
+            out[i] = total
+        return out
+
+
+def _int8_dot(matrix: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Dot product of every int8 row of matrix with int8 vector q (int32 result)"""
+    global _int8_dot_kernel, numba
+    if _int8_dot_kernel is None:
+        # Keep compiled kernels next to our other caches; the source
+        # __pycache__ does not persist in the packaged app
+        os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(CACHE_DIR, "numba"))
+        import numba
+
+        _int8_dot_kernel = numba.njit(parallel=True, fastmath=True, cache=True)(
+            _int8_dot_py
+        )
+    return _int8_dot_kernel(matrix, q)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """True for request timeouts and HTTP 429 rate limit responses"""
+    import httpx
+
+    if isinstance(error, httpx.TimeoutException):
+        return True
+    response = getattr(error, "raw_response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+def _history_row_to_test(row: dict) -> dict:
+    """Convert a speedtest_history row to the test dictionary used by the UI"""
+    server = row.get("server_name") or "Unknown"
+    if row.get("server_country"):
+        server += f" ({row['server_country']})"
+    return {
+        "timestamp": row.get("timestamp", "Unknown"),
+        "isp": row.get("isp") or "Unknown",
+        "server": server,
+        "ping": row.get("ping_ms", 0),
+        "jitter": row.get("jitter_ms", 0),
+        "download": row.get("download_mbps", 0),
+        "upload": row.get("upload_mbps", 0),
+    }
+
+
+def _quantize_int8_array(vec) -> tuple[np.ndarray, float]:
+    """Quantize a vector to an int8 array with a single per-vector scale"""
+    arr = np.asarray(vec, dtype=np.float32)
+    scale = float(np.abs(arr).max(initial=0.0)) / 127 or 1.0
+    return np.round(arr / scale).astype(np.int8), scale
+
+
+def _quantize_int8(vec: list[float]) -> tuple[bytes, float]:
+    """
+    Quantize an embedding to int8 with a single per-vector scale
+
+    Args:
+        vec: Embedding values
+
+    Returns:
+        Tuple of (int8 bytes, scale)
+    """
+    arr, scale = _quantize_int8_array(vec)
+    return arr.tobytes(), scale
+
+
+def _dequantize_int8(buf: bytes, scale: float) -> list[float]:
+    """Restore an embedding quantized by _quantize_int8"""
+    return (np.frombuffer(buf, dtype=np.int8).astype(np.float32) * scale).tolist()
+
+
+def _encode_embedding(vec: list[float]) -> bytes:
+    """Pack an embedding as float32 scale followed by int8 values"""
+    buf, scale = _quantize_int8(vec)
+    return np.float32(scale).tobytes() + buf
+
+
+def _decode_embedding(blob: bytes) -> list[float]:
+    """Unpack an embedding stored by _encode_embedding"""
+    scale = float(np.frombuffer(blob[:4], dtype=np.float32)[0])
+    return _dequantize_int8(blob[4:], scale)
+
+
+# Fixed instructions around the data of generate_summary
+SUMMARY_INTRO = "Provide a brief 2-3 sentence summary of this network speed test:\n"
+SUMMARY_TAIL = "\nFocus on overall quality and any notable issues."
+
+# Fixed instructions around the data of generate_quick_summary
+QUICK_SUMMARY_INTRO = (
+    "Buat ringkasan singkat dalam 1 paragraf (maksimal 3-4 kalimat) tentang hasil "
+    "speedtest ini. Gunakan bahasa Indonesia yang santai dan mudah dipahami:\n"
+)
+QUICK_SUMMARY_TAIL = """
+Fokus pada:
+1. Penilaian kualitas secara keseluruhan
+2. Cocok untuk aktivitas apa (streaming, gaming, video call, dll)
+3. Satu insight atau saran singkat
+
+Gunakan bahasa yang friendly dan to-the-point. Jangan pakai bullet points, cukup paragraf mengalir."""
+
+
+class _DiskLRUCache:
+    """Small LRU memory cache backed by a size-bounded SQLite file on disk"""
+
+    # Rows written between two prunes of the disk tier
+    PRUNE_INTERVAL = 64
+
+    def __init__(
+        self,
+        name: str,
+        memory_size: int = 256,
+        disk_size: int = 10000,
+        encode: Callable = json_dumps,
+        decode: Callable = json_loads,
+    ):
+        """
+        Open (or create) the cache database
+
+        Args:
+            name: Cache file name (without extension) inside CACHE_DIR
+            memory_size: Number of entries kept in the in-memory LRU front
+            disk_size: Number of entries kept on disk (least recently used
+                       entries beyond this are deleted)
+            encode: Converts a value to the str/bytes stored on disk
+            decode: Converts stored str/bytes back to a value
+        """
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.encode = encode
+        self.decode = decode
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(CACHE_DIR, f"{name}.sqlite3"), check_same_thread=False
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB, used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(cache)")]
+            if "used" not in columns:
+                # Cache files from before the disk tier was bounded
+                self._db.execute(
+                    "ALTER TABLE cache ADD COLUMN used REAL NOT NULL DEFAULT 0"
+                )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+            self._prune()
+        except Exception as e:
+            print(f"⚠️ Disk cache unavailable, using memory only: {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Build a stable cache key from the given parts"""
+        return hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+            if self._db is None:
+                return None
+
+            row = self._db.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            try:
+                self._db.execute(
+                    "UPDATE cache SET used = ? WHERE key = ?", (time.time(), key)
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"⚠️ Disk cache write error: {e}")
+
+            value = self.decode(row[0])
+            self._remember(key, value)
+            return value
+
+    def set(self, key: str, value):
+        """Store value under key in memory and on disk"""
+        with self._lock:
+            self._remember(key, value)
+            if self._db is None:
+                return
+
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, used) VALUES (?, ?, ?)",
+                    (key, self.encode(value), time.time()),
+                )
+                self._writes += 1
+                if self._writes % self.PRUNE_INTERVAL == 0:
+                    self._prune()
+                self._db.commit()
+            except Exception as e:
+                print(f"⚠️ Disk cache write error: {e}")
+
+    def _prune(self):
+        """Delete the least recently used disk entries beyond disk_size"""
+        self._db.execute(
+            "DELETE FROM cache WHERE key IN "
+            "(SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_size,),
+        )
+        self._db.commit()
+
+    def _remember(self, key: str, value):
+        """Insert into the memory front, evicting the least recently used entry"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
 
 class MistralRAGAnalyzer:
     """Manages Mistral AI API and RAG operations"""
@@ -22,10 +408,46 @@ class MistralRAGAnalyzer:
         self.api_key = api_key
         self.supabase_manager = supabase_manager
         self.is_configured = False
-
-        # Configure Mistral AI
+        self.embedding_cache = _DiskLRUCache(
+            "embeddings_i8", encode=_encode_embedding, decode=_decode_embedding
+        )
+        self.completion_cache = _DiskLRUCache("completions", memory_size=64)
+
+        # Descriptions of unchanged tests are reused (e.g. on UI re-renders)
+        self._describe_test_cached = functools.lru_cache(maxsize=128)(
+            self._describe_test
+        )
+
+        # Hot cache of normalized history embeddings for in-process search
+        # Rows are normalized; int8 with per-row scales when numba can score
+        # them, float32 (scales of 1) otherwise
+        self._hot_matrix: np.ndarray | None = None
+        self._hot_scales: np.ndarray | None = None
+        self._hot_ids: list[int | None] = []
+        self._hot_rows: list[dict] = []
+        self._hot_count = 0  # History row count when the cache was loaded
+        self._hot_complete = False  # True when it mirrors the whole history
+        self._hot_loaded = False
+        self._hot_lock = threading.Lock()
+        self._hot_load_lock = threading.Lock()
+
+        # Pooled keep-alive HTTP clients shared by every API call
+        self.http_client = None
+        self.async_http_client = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+        # Configure Mistral AI (SDK imported here to keep app startup fast)
+        self.client = None
         try:
-            self.client = Mistral(api_key=api_key)
+            from mistralai import Mistral
+
+            self._create_http_clients()
+            self.client = Mistral(
+                api_key=api_key,
+                client=self.http_client,
+                async_client=self.async_http_client,
+            )
             self.embedding_model = "mistral-embed"  # Mistral embedding model
             self.generation_model = "mistral-large-latest"  # Mistral chat model
             self.is_configured = True
@@ -34,7 +456,63 @@ class MistralRAGAnalyzer:
             print(f"❌ Mistral AI configuration error: {e}")
             self.is_configured = False
 
-    def generate_embedding(self, text: str) -> Optional[List[float]]:
+    def _create_http_clients(self):
+        """Create HTTP clients with connection pooling (HTTP/2 when h2 is installed)"""
+        import httpx
+
+        http2 = importlib.util.find_spec("h2") is not None
+        limits = httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60.0)
+        self.http_client = httpx.Client(http2=http2, limits=limits, timeout=30.0)
+        self.async_http_client = httpx.AsyncClient(
+            http2=http2, limits=limits, timeout=30.0
+        )
+
+    def _run_async(self, coro):
+        """
+        Run a coroutine on the analyzer's background event loop
+
+        The async HTTP client keeps its pooled connections bound to one event
+        loop, so every async call goes through the same long-lived loop.
+        """
+        return self._submit_async(coro).result()
+
+    def _submit_async(self, coro) -> Future:
+        """Schedule a coroutine on the background event loop, starting it if needed"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def close(self):
+        """Close pooled HTTP connections and stop the background event loop"""
+        if self.http_client is not None:
+            self.http_client.close()
+            self.http_client = None
+
+        if self._loop is not None:
+            if self.async_http_client is not None:
+                asyncio.run_coroutine_threadsafe(
+                    self.async_http_client.aclose(), self._loop
+                ).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+        elif self.async_http_client is not None:
+            # No async call ran yet, so the client is not bound to any loop
+            asyncio.run(self.async_http_client.aclose())
+        self.async_http_client = None
+
+    def __del__(self):
+        # Never block here: during interpreter shutdown the loop thread is gone
+        try:
+            if self.http_client is not None:
+                self.http_client.close()
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+        except Exception:
+            pass
+
+    def generate_embedding(self, text: str) -> list[float] | None:
         """
         Generate embedding using Mistral AI embedding model
 
@@ -44,21 +522,71 @@ class MistralRAGAnalyzer:
         Returns:
             List of floats (1024 dimensions for Mistral) or None if error
         """
+        embeddings = self.generate_embeddings_batch([text])
+        return embeddings[0] if embeddings else None
+
+    def generate_embeddings_batch(
+        self, texts: list[str], batch_size: int = 32
+    ) -> list[list[float]] | None:
+        """
+        Generate embeddings for many texts, packing several texts per API call
+
+        Args:
+            texts: Texts to embed
+            batch_size: Number of texts sent in a single request
+
+        Returns:
+            List of embeddings in the same order as texts, or None if error
+        """
         if not self.is_configured:
             print("❌ Mistral AI not configured")
             return None
 
         try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model, inputs=[text]
-            )
-            return response.data[0].embedding
+            keys = [
+                _DiskLRUCache.make_key(self.embedding_model, text) for text in texts
+            ]
+            embeddings = [self.embedding_cache.get(key) for key in keys]
+
+            # Only send texts that are not cached yet
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            for start in range(0, len(missing), batch_size):
+                chunk = missing[start : start + batch_size]
+                response = self._create_embeddings([texts[i] for i in chunk])
+                for i, item in zip(chunk, response.data):
+                    embeddings[i] = item.embedding
+                    self.embedding_cache.set(keys[i], item.embedding)
+            return embeddings
 
         except Exception as e:
             print(f"❌ Embedding generation error: {e}")
             return None
 
-    def create_test_description(self, test_data: Dict) -> str:
+    def _create_embeddings(self, inputs: list[str]):
+        """Call the embeddings API, retrying timeouts and rate limits with backoff"""
+        for attempt in range(EMBED_RETRIES):
+            try:
+                return self.client.embeddings.create(
+                    model=self.embedding_model, inputs=inputs
+                )
+            except Exception as e:
+                if attempt == EMBED_RETRIES - 1 or not _is_retryable(e):
+                    raise
+                time.sleep(EMBED_BACKOFF * (1 << attempt))
+
+    async def _create_embeddings_async(self, inputs: list[str]):
+        """Async variant of _create_embeddings"""
+        for attempt in range(EMBED_RETRIES):
+            try:
+                return await self.client.embeddings.create_async(
+                    model=self.embedding_model, inputs=inputs
+                )
+            except Exception as e:
+                if attempt == EMBED_RETRIES - 1 or not _is_retryable(e):
+                    raise
+                await asyncio.sleep(EMBED_BACKOFF * (1 << attempt))
+
+    def create_test_description(self, test_data: dict) -> str:
         """
         Convert test data to text for embedding
 
@@ -68,18 +596,23 @@ class MistralRAGAnalyzer:
         Returns:
             Formatted text description
         """
+        fields = CURRENT_TEST_FIELDS({**CURRENT_TEST_DEFAULTS, **test_data})
+        return self._describe_test_cached(fields)
+
+    def _describe_test(self, fields: tuple) -> str:
+        """Format the description for a CURRENT_TEST_FIELDS tuple"""
+        timestamp, isp, server, ping, jitter, download, upload = fields
+
         # Assess network quality
-        ping = float(test_data.get("ping", 0))
-        jitter = float(test_data.get("jitter", 0))
-        download = float(test_data.get("download", 0))
-        upload = float(test_data.get("upload", 0))
+        ping, jitter = float(ping), float(jitter)
+        download, upload = float(download), float(upload)
 
         quality = self._assess_quality(ping, jitter, download, upload)
 
         return f"""Network Speed Test Results:
-- Date: {test_data.get('timestamp', 'Unknown')}
-- ISP: {test_data.get('isp', 'Unknown')}
-- Server: {test_data.get('server', 'Unknown')}
+- Date: {timestamp}
+- ISP: {isp}
+- Server: {server}
 - Latency: {ping}ms (Jitter: {jitter}ms)
 - Download Speed: {download} Mbps
 - Upload Speed: {upload} Mbps
@@ -98,9 +631,34 @@ class MistralRAGAnalyzer:
         else:
             return "Poor"
 
+    def _assess_quality_batch(self, pings, jitters, downloads, uploads) -> np.ndarray:
+        """
+        Assess network quality for many tests at once
+
+        Args:
+            pings: Sequence of ping values (ms)
+            jitters: Sequence of jitter values (ms)
+            downloads: Sequence of download speeds (Mbps)
+            uploads: Sequence of upload speeds (Mbps)
+
+        Returns:
+            Array of quality labels, same rules as _assess_quality
+        """
+        # (N, 4) matrix of metrics
+        metrics = np.column_stack([pings, jitters, downloads, uploads]).astype(float)
+
+        # (N, 3) -> does each test meet every threshold of each quality level
+        lower = metrics[:, None, :] < QUALITY_THRESHOLDS[None, :, :]
+        higher = metrics[:, None, :] > QUALITY_THRESHOLDS[None, :, :]
+        passes = np.where(QUALITY_HIGHER_IS_BETTER, higher, lower).all(axis=2)
+
+        # "Poor" always matches, so argmax picks the best level reached
+        passes = np.column_stack([passes, np.ones(len(metrics), dtype=bool)])
+        return QUALITY_LABELS[passes.argmax(axis=1)]
+
     def create_chat_embedding(
         self, user_message: str, bot_response: str
-    ) -> Optional[List[float]]:
+    ) -> list[float] | None:
         """
         Create embedding for chat conversation
 
@@ -127,7 +685,7 @@ Bot Answer: {bot_response}"""
             print(f"❌ Chat embedding generation error: {e}")
             return None
 
-    def analyze_test_results(self, current_test: Dict) -> Dict:
+    def analyze_test_results(self, current_test: dict) -> dict:
         """
         Main RAG analysis function
 
@@ -137,64 +695,470 @@ Bot Answer: {bot_response}"""
         Returns:
             Dictionary with analysis results
         """
+        stream = self.analyze_test_results_stream(current_test)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as done:
+                return done.value
+
+    def analyze_test_results_stream(
+        self, current_test: dict
+    ) -> Generator[str, None, dict]:
+        """
+        RAG analysis that yields the AI answer while it is being generated
+
+        Args:
+            current_test: Current test result dictionary
+
+        Yields:
+            Chunks of the analysis text as they arrive
+
+        Returns:
+            Dictionary with analysis results (the generator's return value)
+        """
         if not self.is_configured:
             return {"error": "Mistral AI API not configured", "success": False}
 
         try:
-            # 1. Generate embedding for current test
-            print("🔄 Generating embedding for current test...")
-            test_description = self.create_test_description(current_test)
-            embedding = self.generate_embedding(test_description)
-
-            if not embedding:
+            context = self._run_async(self._gather_context_async(current_test))
+            if context is None:
                 return {"error": "Failed to generate embedding", "success": False}
+            similar_tests, stats = context
 
-            # 2. Query similar historical tests
-            print("🔄 Searching for similar historical tests...")
-            similar_tests = []
-            if self.supabase_manager and self.supabase_manager.is_connected:
-                similar_tests = self.supabase_manager.query_similar_tests(
-                    embedding, limit=5
-                )
+            # 3. Build prompt and stream AI analysis
+            print("🔄 Generating AI analysis...")
+            system_msg, user_msg = self.build_analysis_prompt(
+                current_test, similar_tests, stats
+            )
+
+            parts = []
+            with self.client.chat.stream(
+                model=self.generation_model,
+                messages=[
+                    {"role": "system", "content": system_msg},
+                    {"role": "user", "content": user_msg},
+                ],
+            ) as chat_stream:
+                for chunk in chat_stream:
+                    content = chunk.data.choices[0].delta.content
+                    if content:
+                        parts.append(content)
+                        yield content
+            analysis_text = "".join(parts)
+
+            # 4. Parse and structure response
+            return self._build_analysis_result(
+                current_test, similar_tests, stats, analysis_text
+            )
+
+        except Exception as e:
+            print(f"❌ Analysis error: {e}")
+            return {"error": str(e), "success": False}
+
+    async def analyze_test_results_async(self, current_test: dict) -> dict:
+        """
+        Async RAG analysis, overlapping the independent network calls
 
-            # 3. Get statistics
-            print("🔄 Calculating statistics...")
-            stats = {}
-            if self.supabase_manager and self.supabase_manager.is_connected:
-                stats = self.supabase_manager.get_statistics()
+        The work runs on the analyzer's background loop (where the pooled async
+        client lives) and is awaited from the caller's loop.
 
-            # 4. Build prompt and get AI analysis
+        Args:
+            current_test: Current test result dictionary
+
+        Returns:
+            Dictionary with analysis results
+        """
+        return await asyncio.wrap_future(
+            self._submit_async(self._analyze_test_results_async(current_test))
+        )
+
+    async def _analyze_test_results_async(self, current_test: dict) -> dict:
+        """Body of analyze_test_results_async (runs on the background loop)"""
+        if not self.is_configured:
+            return {"error": "Mistral AI API not configured", "success": False}
+
+        try:
+            context = await self._gather_context_async(current_test)
+            if context is None:
+                return {"error": "Failed to generate embedding", "success": False}
+            similar_tests, stats = context
+
+            # 3. Build prompt and get AI analysis
             print("🔄 Generating AI analysis...")
-            prompt = self.build_analysis_prompt(current_test, similar_tests, stats)
+            system_msg, user_msg = self.build_analysis_prompt(
+                current_test, similar_tests, stats
+            )
 
             # Use Mistral chat completion
-            chat_response = self.client.chat.complete(
+            chat_response = await self.client.chat.complete_async(
                 model=self.generation_model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": system_msg},
+                    {"role": "user", "content": user_msg},
+                ],
             )
             analysis_text = chat_response.choices[0].message.content
 
-            # 5. Parse and structure response
-            parsed_analysis = self.parse_ai_response(analysis_text)
-
-            return {
-                "success": True,
-                "current_test": current_test,
-                "similar_tests": similar_tests,
-                "statistics": stats,
-                "analysis": parsed_analysis,
-                "raw_analysis": analysis_text,
-            }
+            # 4. Parse and structure response
+            return self._build_analysis_result(
+                current_test, similar_tests, stats, analysis_text
+            )
 
         except Exception as e:
             print(f"❌ Analysis error: {e}")
             return {"error": str(e), "success": False}
 
+    async def _gather_context_async(
+        self, current_test: dict
+    ) -> tuple[list[dict], dict] | None:
+        """
+        Retrieve similar tests and statistics for the analysis prompt
+
+        Statistics are fetched while the embedding is generated, and the
+        similarity search runs as soon as the embedding is available.
+
+        Args:
+            current_test: Current test result dictionary
+
+        Returns:
+            Tuple of (similar_tests, stats), or None if embedding failed
+        """
+        has_database = bool(
+            self.supabase_manager and self.supabase_manager.is_connected
+        )
+
+        # 1. Generate embedding for current test and get statistics concurrently
+        print("🔄 Generating embedding and calculating statistics...")
+        test_description = self.create_test_description(current_test)
+        stats_task = None
+        if has_database:
+            stats_task = asyncio.create_task(
+                asyncio.to_thread(self.supabase_manager.get_statistics)
+            )
+            hot_task = asyncio.create_task(asyncio.to_thread(self._load_hot_cache))
+
+        embedding_key = _DiskLRUCache.make_key(self.embedding_model, test_description)
+        embedding = self.embedding_cache.get(embedding_key)
+        if embedding is None:
+            try:
+                embed_response = await self._create_embeddings_async([test_description])
+                embedding = embed_response.data[0].embedding
+                self.embedding_cache.set(embedding_key, embedding)
+            except Exception as e:
+                print(f"❌ Embedding generation error: {e}")
+
+        if not embedding:
+            if stats_task:
+                stats_task.cancel()
+                hot_task.cancel()
+            return None
+
+        # 2. Query similar historical tests while statistics finish
+        print("🔄 Searching for similar historical tests...")
+        similar_tests = []
+        stats = {}
+        if has_database:
+            try:
+                await hot_task
+            except Exception as e:
+                print(f"⚠️ Local search cache unavailable: {e}")
+            if self._hot_complete and len(self._hot_ids) < HOT_CACHE_LIMIT:
+                # Small history: search locally instead of a database round-trip
+                similar_tests = self.local_query(embedding, 5, MATCH_THRESHOLD)
+                stats = await stats_task
+            else:
+                similar_task = asyncio.create_task(
+                    asyncio.to_thread(
+                        self.supabase_manager.query_similar_tests,
+                        embedding,
+                        5,
+                        MATCH_THRESHOLD,
+                    )
+                )
+                similar_tests, stats = await asyncio.gather(similar_task, stats_task)
+
+        return similar_tests, stats
+
+    def _load_hot_cache(self):
+        """
+        Fill the hot cache from Supabase, if the history is small
+
+        The row count seen at load time is kept; when the history count no
+        longer matches (rows added or removed elsewhere) the cache is
+        reloaded. Large histories are left to the database search, and a
+        failed or empty fetch is retried on the next analysis.
+        """
+        with self._hot_load_lock:
+            total = self.supabase_manager.get_total_count()
+            if self._hot_loaded:
+                if total == self._hot_count:
+                    return
+                self._clear_hot_cache()
+
+            if total >= HOT_CACHE_LIMIT:
+                self._hot_count = total
+                self._hot_loaded = True
+                return
+
+            rows = self.supabase_manager.get_recent_tests(
+                limit=HOT_CACHE_LIMIT, columns="*"
+            )
+            if not rows:
+                return
+
+            missing = False
+            for row in rows:
+                embedding = row.get("embedding")
+                if isinstance(embedding, str):
+                    # pgvector values arrive as "[0.1,0.2,...]"
+                    embedding = json_loads(embedding)
+                if embedding:
+                    row = {k: v for k, v in row.items() if k != "embedding"}
+                    self._add_to_hot_cache(row, embedding)
+                else:
+                    missing = True
+
+            if HAS_NUMBA and self._hot_matrix is not None:
+                # Compile (or load) the int8 kernel here, not on the first query
+                _int8_dot(self._hot_matrix[:1], self._hot_matrix[0])
+
+            # Rows without an embedding are invisible to the local search,
+            # so only a fully embedded history may skip the RPC
+            self._hot_complete = len(rows) < HOT_CACHE_LIMIT and not missing
+            self._hot_count = total
+            self._hot_loaded = True
+            print(f"✅ Loaded {len(self._hot_ids)} embeddings into local search cache")
+
+    def _reset_hot_cache(self):
+        """Empty the hot cache so the next analysis loads it again"""
+        with self._hot_load_lock:
+            self._clear_hot_cache()
+
+    def _clear_hot_cache(self):
+        """Drop every cached row (caller holds _hot_load_lock)"""
+        with self._hot_lock:
+            self._hot_matrix = None
+            self._hot_scales = None
+            self._hot_ids = []
+            self._hot_rows = []
+            self._hot_count = 0
+            self._hot_complete = False
+            self._hot_loaded = False
+
+    def _add_to_hot_cache(self, row: dict, embedding: list[float]):
+        """Append a history row and its normalized embedding to the hot cache"""
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            return
+
+        if HAS_NUMBA:
+            hot_row, scale = _quantize_int8_array(vec / norm)
+        else:
+            hot_row, scale = vec / norm, 1.0
+        with self._hot_lock:
+            count = len(self._hot_ids)
+            if self._hot_matrix is None:
+                self._hot_matrix = np.empty((64, len(vec)), dtype=hot_row.dtype)
+                self._hot_scales = np.empty(64, dtype=np.float32)
+            elif self._hot_matrix.shape[1] != len(vec):
+                return
+            elif count == len(self._hot_matrix):
+                # Grow by doubling to keep appends amortized O(1)
+                grown = np.empty((2 * count, len(vec)), dtype=hot_row.dtype)
+                grown[:count] = self._hot_matrix
+                self._hot_matrix = grown
+                grown_scales = np.empty(2 * count, dtype=np.float32)
+                grown_scales[:count] = self._hot_scales
+                self._hot_scales = grown_scales
+
+            self._hot_matrix[count] = hot_row
+            self._hot_scales[count] = scale
+            self._hot_ids.append(row.get("id"))
+            self._hot_rows.append(row)
+
+    def remember_test(self, test_data: dict, embedding: list[float] | None):
+        """
+        Add a newly saved test to the local search cache
+
+        Args:
+            test_data: Test result dictionary (as saved to Supabase)
+            embedding: Embedding of the test description
+        """
+        with self._hot_lock:
+            if self._hot_loaded:
+                # The saved row is accounted for; no reload needed
+                self._hot_count += 1
+        if not embedding or not self._hot_complete:
+            return
+
+        row = {
+            "timestamp": test_data.get("timestamp", "Unknown"),
+            "isp": test_data.get("isp", "Unknown"),
+            "server_name": test_data.get("server", "Unknown"),
+            "ping_ms": test_data.get("ping", 0),
+            "jitter_ms": test_data.get("jitter", 0),
+            "download_mbps": test_data.get("download", 0),
+            "upload_mbps": test_data.get("upload", 0),
+        }
+        self._add_to_hot_cache(row, embedding)
+
+    def local_query(
+        self,
+        embedding: list[float],
+        k: int = 5,
+        match_threshold: float = MATCH_THRESHOLD,
+    ) -> list[dict]:
+        """
+        Find the most similar cached tests using in-process cosine similarity
+
+        Args:
+            embedding: Query vector
+            k: Number of results to return
+            match_threshold: Minimum similarity score (0-1), as in the RPC
+
+        Returns:
+            List of similar test rows with a similarity score, best first
+        """
+        with self._hot_lock:
+            count = len(self._hot_ids)
+            if count == 0 or k <= 0:
+                return []
+
+            q = np.asarray(embedding, dtype=np.float32)
+            if len(q) != self._hot_matrix.shape[1]:
+                return []
+            q = q / (np.linalg.norm(q) or 1.0)
+
+            if self._hot_matrix.dtype == np.int8:
+                q_i8, q_scale = _quantize_int8_array(q)
+                sims = self._local_query_int8(
+                    q_i8, self._hot_matrix[:count], self._hot_scales[:count], q_scale
+                )
+            else:
+                sims = self._hot_matrix[:count] @ q
+            k = min(k, count)
+            idx = np.argpartition(-sims, k - 1)[:k]
+            idx = idx[np.argsort(-sims[idx])]
+            return [
+                {**self._hot_rows[i], "similarity": float(sims[i])}
+                for i in idx
+                if sims[i] > match_threshold
+            ]
+
+    def _local_query_int8(
+        self,
+        q_i8: np.ndarray,
+        matrix_i8: np.ndarray,
+        scales: np.ndarray,
+        q_scale: float,
+    ) -> np.ndarray:
+        """Cosine similarities of int8 rows (with scales) against an int8 query"""
+        return _int8_dot(matrix_i8, q_i8) * scales * np.float32(q_scale)
+
+    def backfill_missing_embeddings(
+        self,
+        rows: list[dict] | None = None,
+        batch_size: int = 32,
+        max_workers: int = 4,
+    ) -> int:
+        """
+        Generate and store embeddings for history rows that have none
+
+        Descriptions are embedded in batches (through the embedding cache),
+        with several batches in flight at once, and each batch is written
+        back to Supabase in one call by the worker that embedded it.
+
+        Args:
+            rows: speedtest_history rows to backfill (all rows missing an
+                  embedding are fetched page by page if not given)
+            batch_size: Number of descriptions per embeddings request
+            max_workers: Number of concurrent embeddings requests
+
+        Returns:
+            Number of rows updated
+        """
+        if not self.is_configured:
+            print("❌ Mistral AI not configured")
+            return 0
+        if not (self.supabase_manager and self.supabase_manager.is_connected):
+            return 0
+
+        try:
+            if rows is not None:
+                return self._backfill_rows(rows, batch_size, max_workers)
+
+            # Each page holds the oldest rows still missing an embedding;
+            # stop once a page makes no progress (only failing rows are left)
+            updated = 0
+            while rows := self.supabase_manager.get_tests_without_embedding():
+                page_updated = self._backfill_rows(rows, batch_size, max_workers)
+                if not page_updated:
+                    break
+                updated += page_updated
+            return updated
+
+        except Exception as e:
+            print(f"❌ Embedding backfill error: {e}")
+            return 0
+
+    def _backfill_rows(
+        self, rows: list[dict], batch_size: int, max_workers: int
+    ) -> int:
+        """Embed and store one list of rows; failed batches are skipped"""
+        if not rows:
+            return 0
+
+        chunks = [
+            rows[start : start + batch_size]
+            for start in range(0, len(rows), batch_size)
+        ]
+
+        def backfill_chunk(chunk: list[dict]) -> int:
+            descriptions = [
+                self.create_test_description(_history_row_to_test(row)) for row in chunk
+            ]
+            vectors = self.generate_embeddings_batch(descriptions, batch_size)
+            if not vectors:
+                return 0
+            return self.supabase_manager.bulk_update_embeddings(
+                [row["id"] for row in chunk], vectors
+            )
+
+        print(f"🔄 Backfilling embeddings for {len(rows)} tests...")
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            updated = sum(pool.map(backfill_chunk, chunks))
+
+        if updated:
+            # Backfilled rows were skipped by the hot cache; reload it
+            self._reset_hot_cache()
+
+        print(f"✅ Backfilled embeddings: {updated}/{len(rows)} tests")
+        return updated
+
+    def _build_analysis_result(
+        self,
+        current_test: dict,
+        similar_tests: list[dict],
+        stats: dict,
+        analysis_text: str,
+    ) -> dict:
+        """Parse the AI answer and package the analysis result"""
+        return {
+            "success": True,
+            "current_test": current_test,
+            "similar_tests": similar_tests,
+            "statistics": stats,
+            "analysis": self.parse_ai_response(analysis_text),
+            "raw_analysis": analysis_text,
+        }
+
     def build_analysis_prompt(
-        self, current_test: Dict, similar_tests: List[Dict], stats: Dict
-    ) -> str:
+        self, current_test: dict, similar_tests: list[dict], stats: dict
+    ) -> tuple[str, str]:
         """
-        Build comprehensive prompt with context
+        Build system instructions and compact data message for the analysis
 
         Args:
             current_test: Current test data
@@ -202,75 +1166,34 @@ Bot Answer: {bot_response}"""
             stats: Statistical data
 
         Returns:
-            Formatted prompt string
+            Tuple of (system_message, user_message)
         """
         # Format current test
-        current_info = f"""
-CURRENT TEST RESULTS:
-- Timestamp: {current_test.get('timestamp', 'Unknown')}
-- ISP: {current_test.get('isp', 'Unknown')}
-- Server: {current_test.get('server', 'Unknown')}
-- Ping: {current_test.get('ping', 0)}ms
-- Jitter: {current_test.get('jitter', 0)}ms
-- Download: {current_test.get('download', 0)} Mbps
-- Upload: {current_test.get('upload', 0)} Mbps
-"""
+        parts = [
+            CURRENT_TEST_TEMPLATE.format_map({**CURRENT_TEST_DEFAULTS, **current_test})
+        ]
 
         # Format similar tests
-        similar_info = "\nSIMILAR HISTORICAL TESTS:\n"
         if similar_tests:
+            parts.append(SIMILAR_TESTS_HEADER)
             for i, test in enumerate(similar_tests[:5], 1):
-                similar_info += f"""
-Test {i}:
-- Date: {test.get('timestamp', 'Unknown')}
-- ISP: {test.get('isp', 'Unknown')}
-- Server: {test.get('server_name', 'Unknown')}
-- Ping: {test.get('ping_ms', 0)}ms, Jitter: {test.get('jitter_ms', 0)}ms
-- Download: {test.get('download_mbps', 0)} Mbps, Upload: {test.get('upload_mbps', 0)} Mbps
-"""
+                parts.append(
+                    SIMILAR_TEST_TEMPLATE.format_map(
+                        {**SIMILAR_TEST_DEFAULTS, **test, "index": i}
+                    )
+                )
         else:
-            similar_info += "No historical data available yet.\n"
+            parts.append("HIST: none\n")
 
         # Format statistics
-        stats_info = "\nSTATISTICAL CONTEXT:\n"
         if stats and stats.get("count", 0) > 0:
-            stats_info += f"""
-- Total Tests: {stats.get('count', 0)}
-- Average Ping: {stats.get('avg_ping', 0):.1f}ms
-- Average Jitter: {stats.get('avg_jitter', 0):.1f}ms
-- Average Download: {stats.get('avg_download', 0):.2f} Mbps
-- Average Upload: {stats.get('avg_upload', 0):.2f} Mbps
-- Best Download: {stats.get('max_download', 0):.2f} Mbps
-- Best Upload: {stats.get('max_upload', 0):.2f} Mbps
-- Best Ping: {stats.get('min_ping', 0):.1f}ms
-"""
+            parts.append(STATS_TEMPLATE.format_map({**STATS_DEFAULTS, **stats}))
         else:
-            stats_info += "No historical statistics available yet.\n"
-
-        # Build complete prompt in Indonesian
-        prompt = f"""Kamu adalah seorang ahli analisis performa jaringan internet. Analisis hasil speedtest berikut dan berikan insight yang mudah dipahami dalam Bahasa Indonesia.
-
-{current_info}
-{similar_info}
-{stats_info}
-
-Berikan analisis yang komprehensif dengan gaya bahasa yang santai dan mudah dipahami, seperti sedang berbicara dengan teman. Gunakan format berikut:
-
-1. **Penilaian Performa**: Beri rating kualitas internet saat ini (Sangat Bagus/Bagus/Cukup/Kurang Bagus) dan jelaskan alasannya dengan bahasa yang mudah dimengerti.
-
-2. **Analisis Tren**: Bandingkan hasil sekarang dengan data historis. Apakah internet makin cepat, makin lambat, atau stabil? Jelaskan dengan contoh konkret.
-
-3. **Deteksi Anomali**: Cari pola yang tidak biasa atau aneh dari hasil test ini dibanding biasanya. Misalnya ping tiba-tiba tinggi atau download speed turun drastis.
-
-4. **Analisis Penyebab**: Berdasarkan data yang ada, jelaskan kemungkinan penyebab performa saat ini. Contoh: "Sepertinya jaringan lagi rame nih" atau "Koneksi ke server jauh jadi ping-nya tinggi".
-
-5. **Rekomendasi**: Berikan 3-5 saran praktis yang bisa langsung dilakukan untuk meningkatkan kualitas internet. Gunakan bahasa sehari-hari yang gampang dipahami.
-
-Penting: Gunakan bahasa Indonesia yang natural, santai, dan mudah dipahami. Hindari istilah teknis yang terlalu rumit. Jika harus pakai istilah teknis, jelaskan artinya dengan bahasa sederhana."""
+            parts.append("STATS: none\n")
 
-        return prompt
+        return ANALYSIS_SYSTEM_PROMPT, "".join(parts)
 
-    def parse_ai_response(self, response: str) -> Dict:
+    def parse_ai_response(self, response: str) -> dict:
         """
         Parse and structure AI response (supports Indonesian)
 
@@ -289,39 +1212,20 @@ Penting: Gunakan bahasa Indonesia yang natural, santai, dan mudah dipahami. Hind
         }
 
         try:
-            # Simple parsing - split by section headers (English & Indonesian)
-            current_section = None
-            lines = response.split("\n")
-
-            for line in lines:
-                line_lower = line.lower().strip()
-
-                # Detect section headers (Indonesian & English)
-                if (
-                    "penilaian performa" in line_lower
-                    or "performance assessment" in line_lower
-                ):
-                    current_section = "performance_assessment"
-                elif "analisis tren" in line_lower or "trend analysis" in line_lower:
-                    current_section = "trend_analysis"
-                elif (
-                    "deteksi anomali" in line_lower or "anomaly detection" in line_lower
-                ):
-                    current_section = "anomaly_detection"
-                elif "analisis penyebab" in line_lower or "root cause" in line_lower:
-                    current_section = "root_cause_analysis"
-                elif "rekomendasi" in line_lower or "recommendation" in line_lower:
-                    current_section = "recommendations"
-                elif current_section and line.strip():
-                    # Add content to current section
-                    if current_section == "recommendations":
-                        # Extract bullet points
-                        if line.strip().startswith(
-                            ("-", "•", "*", "1.", "2.", "3.", "4.", "5.")
-                        ):
-                            sections["recommendations"].append(line.strip())
-                    else:
-                        sections[current_section] += line + "\n"
+            # Each header line starts a section that runs until the next header
+            matches = list(SECTION_RE.finditer(response))
+            for match, next_match in zip(matches, matches[1:] + [None]):
+                section = SECTION_KEYS[match.lastgroup]
+                end = next_match.start() if next_match else len(response)
+                section_text = response[match.end() : end]
+
+                if section == "recommendations":
+                    # Extract bullet points
+                    sections["recommendations"].extend(
+                        RECOMMENDATION_RE.findall(section_text)
+                    )
+                else:
+                    sections[section] += BLANK_LINE_RE.sub("", section_text)
 
             # Clean up sections
             for key in sections:
@@ -333,7 +1237,33 @@ Penting: Gunakan bahasa Indonesia yang natural, santai, dan mudah dipahami. Hind
 
         return sections
 
-    def generate_summary(self, test_data: Dict) -> str:
+    def _complete_cached(self, prompt: str, temperature: float | None = None) -> str:
+        """
+        Run a chat completion, reusing the cached answer for identical prompts
+
+        Args:
+            prompt: User prompt sent to the model
+            temperature: Optional sampling temperature (part of the cache key)
+
+        Returns:
+            Completion text
+        """
+        key = _DiskLRUCache.make_key(self.generation_model, temperature, prompt)
+        cached = self.completion_cache.get(key)
+        if cached is not None:
+            return cached
+
+        options = {} if temperature is None else {"temperature": temperature}
+        chat_response = self.client.chat.complete(
+            model=self.generation_model,
+            messages=[{"role": "user", "content": prompt}],
+            **options,
+        )
+        content = chat_response.choices[0].message.content
+        self.completion_cache.set(key, content)
+        return content
+
+    def generate_summary(self, test_data: dict) -> str:
         """
         Generate a quick summary without full RAG analysis
 
@@ -347,27 +1277,22 @@ Penting: Gunakan bahasa Indonesia yang natural, santai, dan mudah dipahami. Hind
             return "Mistral AI API not configured"
 
         try:
-            prompt = f"""Provide a brief 2-3 sentence summary of this network speed test:
-
+            data_part = f"""
 Ping: {test_data.get('ping', 0)}ms
 Jitter: {test_data.get('jitter', 0)}ms
 Download: {test_data.get('download', 0)} Mbps
 Upload: {test_data.get('upload', 0)} Mbps
 ISP: {test_data.get('isp', 'Unknown')}
+"""
+            prompt = SUMMARY_INTRO + data_part + SUMMARY_TAIL
 
-Focus on overall quality and any notable issues."""
-
-            chat_response = self.client.chat.complete(
-                model=self.generation_model,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return chat_response.choices[0].message.content
+            return self._complete_cached(prompt)
 
         except Exception as e:
             print(f"❌ Summary generation error: {e}")
             return "Error generating summary"
 
-    def generate_quick_summary(self, test_data: Dict) -> str:
+    def generate_quick_summary(self, test_data: dict) -> str:
         """
         Generate ringkasan singkat 1 paragraf untuk ditampilkan inline
 
@@ -380,35 +1305,24 @@ Focus on overall quality and any notable issues."""
         if not self.is_configured:
             return "Mistral AI belum dikonfigurasi. Silakan atur API key di Settings."
 
-        try:
-            # Assess quality
-            ping = float(test_data.get("ping", 0))
-            download = float(test_data.get("download", 0))
-            upload = float(test_data.get("upload", 0))
-            quality = self._assess_quality(
-                ping, test_data.get("jitter", 0), download, upload
-            )
-
-            prompt = f"""Buat ringkasan singkat dalam 1 paragraf (maksimal 3-4 kalimat) tentang hasil speedtest ini. Gunakan bahasa Indonesia yang santai dan mudah dipahami:
+        # Validate metrics once, then assess quality
+        ping, jitter, download, upload = (
+            float(test_data.get(key, 0))
+            for key in ("ping", "jitter", "download", "upload")
+        )
+        quality = self._assess_quality(ping, jitter, download, upload)
 
+        try:
+            data_part = f"""
 Ping: {ping}ms
 Download: {download} Mbps
 Upload: {upload} Mbps
 ISP: {test_data.get('isp', 'Unknown')}
 Kualitas: {quality}
+"""
+            prompt = QUICK_SUMMARY_INTRO + data_part + QUICK_SUMMARY_TAIL
 
-Fokus pada:
-1. Penilaian kualitas secara keseluruhan
-2. Cocok untuk aktivitas apa (streaming, gaming, video call, dll)
-3. Satu insight atau saran singkat
-
-Gunakan bahasa yang friendly dan to-the-point. Jangan pakai bullet points, cukup paragraf mengalir."""
-
-            chat_response = self.client.chat.complete(
-                model=self.generation_model,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return chat_response.choices[0].message.content.strip()
+            return self._complete_cached(prompt).strip()
 
         except Exception as e:
             print(f"❌ Quick summary error: {e}")
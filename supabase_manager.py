@@ -4,45 +4,208 @@ Manages database operations and vector storage for speedtest history
 """
 
 import os
+import io
+import re
+import logging
+import time
+import asyncio
+import inspect
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
+from functools import lru_cache, wraps
+from operator import itemgetter
 import csv
-from supabase import create_client, Client
-import json
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import numpy as np
+from supabase import create_client, Client, ClientOptions
+
+# Direct Postgres ingest is optional (needs asyncpg and a DATABASE_URL)
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# Server strings look like "Jakarta (ID)"
+_SERVER_RE = re.compile(r'^\s*(.*?)\s*\(([^)]*)\)\s*$')
+
+# Rows per insert request when importing history
+BATCH_SIZE = 1000
+
+# speedtest_history columns written by _prepare_row, in COPY order
+_INSERT_COLS = ('timestamp', 'ping_ms', 'jitter_ms', 'download_mbps', 'upload_mbps',
+                'server_name', 'server_country', 'isp', 'client_ip', 'embedding')
+# Text columns where an empty CSV field means '' rather than NULL
+_TEXT_COLS = ('server_name', 'server_country', 'isp', 'client_ip')
+
+# Parallel embedding calls when importing history
+EMBED_WORKERS = 16
+
+# Rows per request when exporting (Supabase caps responses at 1000 rows by default)
+EXPORT_PAGE_SIZE = 1000
+
+# Column lists for speedtest_history selects
+_STATS_COLS = 'ping_ms, jitter_ms, download_mbps, upload_mbps'
+_STATS_FIELDS = itemgetter('ping_ms', 'jitter_ms', 'download_mbps', 'upload_mbps')
+# id is the export's keyset tie-breaker
+_EXPORT_COLS = 'id, timestamp, ping_ms, jitter_ms, download_mbps, upload_mbps, server_name, server_country, isp'
+_BACKFILL_COLS = _EXPORT_COLS
+# Default projections for list reads (embedding excluded; pass columns='*' for all)
+_RECENT_COLS = 'id, timestamp, ping_ms, jitter_ms, download_mbps, upload_mbps, server_name, isp'
+_CHAT_COLS = 'id, user_ip, user_message, bot_response, timestamp, session_id'
+
+# Header row of the history CSV
+CSV_HEADER = ('Waktu', 'Ping (ms)', 'Jitter (ms)', 'Download (Mbps)', 'Upload (Mbps)', 'Server', 'ISP')
+
+# Aggregates returned by get_statistics (besides 'count')
+STATISTICS_KEYS = ('avg_ping', 'avg_jitter', 'avg_download', 'avg_upload',
+                   'max_download', 'max_upload', 'min_ping')
+EMPTY_STATISTICS = {
+    'count': 0,
+    'avg_ping': 0,
+    'avg_jitter': 0,
+    'avg_download': 0,
+    'avg_upload': 0
+}
+
+# Seconds a cached read result stays fresh
+CACHE_TTL = 30
+
+
+def _ttl_cached(key_template: str):
+    """
+    Cache a read method's result on the instance for CACHE_TTL seconds
+    
+    Args:
+        key_template: Cache key, formatted with the call's arguments
+                      (e.g. 'speedtest:recent:{limit}')
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = key_template.format(**bound.arguments)
+            
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] < CACHE_TTL:
+                return entry[1]
+            
+            value = func(self, *args, **kwargs)
+            # Empty results may come from a failed request, so they are not kept
+            if value:
+                self._cache[key] = (time.monotonic(), value)
+            return value
+        
+        return wrapper
+    return decorator
+
+
+def hnsw_params_for(n: int) -> Dict[str, int]:
+    """
+    Pick HNSW index parameters for a table of n rows
+    Larger tables need more links per node (m) and a wider build/search
+    beam (ef_construction / ef_search) to keep recall up
+    
+    Args:
+        n: Number of rows (expected) in speedtest_history
+        
+    Returns:
+        Dictionary with m, ef_construction and ef_search
+    """
+    if n < 100_000:
+        return {'m': 16, 'ef_construction': 64, 'ef_search': 40}
+    if n < 1_000_000:
+        return {'m': 24, 'ef_construction': 100, 'ef_search': 64}
+    return {'m': 32, 'ef_construction': 128, 'ef_search': 100}
+
+
+def _halfvec_literal(embedding: List[float]) -> str:
+    """
+    Format an embedding as a pgvector literal rounded to float16
+    The embedding column is halfvec, so digits beyond fp16 precision are
+    dropped before sending (about 2.5x smaller than a JSON float list)
+    """
+    return '[' + ','.join(map(str, np.asarray(embedding, dtype=np.float16))) + ']'
+
+
+@lru_cache(maxsize=8)
+def _get_client(url: str, key: str) -> Client:
+    """
+    Return a shared Supabase client for (url, key)
+    Its pooled httpx client keeps connections alive between managers
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        timeout=120
+    )
+    try:
+        options = ClientOptions(httpx_client=http_client)
+    except TypeError:
+        # Older supabase releases build their own httpx client
+        http_client.close()
+        return create_client(url, key)
+    return create_client(url, key, options=options)
 
 
 class SupabaseManager:
     """Manages Supabase database and vector operations"""
     
-    def __init__(self, url: str, key: str):
+    def __init__(self, url: str, key: str, database_url: Optional[str] = None):
         """
         Initialize Supabase client
         
         Args:
             url: Supabase project URL
             key: Supabase API key (anon or service role)
+            database_url: Optional direct Postgres DSN for bulk ingest
+                          (defaults to the DATABASE_URL environment variable)
         """
         self.url = url
         self.key = key
         self.client: Client = None
         self.is_connected = False
+        self._cache: Dict[str, Tuple[float, object]] = {}
         
-    def connect(self) -> bool:
+        # Direct Postgres DSN (asyncpg), used only while migrating CSV data
+        self.database_url = database_url or os.getenv('DATABASE_URL')
+        
+    def invalidate_cache(self, prefix: str = '') -> None:
+        """
+        Drop cached read results
+        
+        Args:
+            prefix: Only drop keys starting with this (e.g. 'speedtest:'), all if empty
+        """
+        # Snapshot the keys: reads on other threads may insert concurrently
+        for key in [k for k in list(self._cache) if k.startswith(prefix)]:
+            self._cache.pop(key, None)
+    
+    def connect(self, verify: bool = False) -> bool:
         """
         Connect to Supabase
         
+        Args:
+            verify: Probe the database with a query before reporting success
+                    (otherwise connection errors surface on the first request)
+        
         Returns:
             bool: True if connection successful
         """
         try:
-            self.client = create_client(self.url, self.key)
-            # Test connection
-            self.client.table('speedtest_history').select("id").limit(1).execute()
+            self.client = _get_client(self.url, self.key)
+            if verify:
+                # Test connection
+                self.client.table('speedtest_history').select("id").limit(1).execute()
             self.is_connected = True
-            print("✅ Connected to Supabase")
+            logger.info("✅ Connected to Supabase")
             return True
-        except Exception as e:
-            print(f"❌ Supabase connection error: {e}")
+        except Exception:
+            logger.exception("❌ Supabase connection error")
             self.is_connected = False
             return False
     
@@ -58,19 +221,25 @@ class SupabaseManager:
             # Note: pgvector extension and table creation should be done via Supabase SQL Editor
             # This method checks if table exists
             result = self.client.table('speedtest_history').select("id").limit(1).execute()
-            print("✅ Database tables already exist")
+            logger.info("✅ Database tables already exist")
             return True
         except Exception as e:
-            print(f"⚠️ Database setup needed. Please run the SQL setup script.")
-            print(f"Error: {e}")
+            logger.warning("⚠️ Database setup needed. Please run the SQL setup script. Error: %s", e)
             return False
     
-    def get_setup_sql(self) -> str:
+    def get_setup_sql(self, n: Optional[int] = None) -> str:
         """
         Returns SQL script for database setup
         User should run this in Supabase SQL Editor
+        
+        Args:
+            n: Row count to tune the HNSW index for (current count if connected)
         """
-        return """
+        if n is None:
+            n = self.get_total_count() if self.is_connected else 0
+        params = hnsw_params_for(n)
+        
+        return f"""
 -- Enable pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
 
@@ -86,15 +255,50 @@ CREATE TABLE IF NOT EXISTS speedtest_history (
     server_country VARCHAR(100),
     isp VARCHAR(255),
     client_ip VARCHAR(50),
-    embedding VECTOR(768),
+    embedding HALFVEC(1024),
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Migration: store embeddings as halfvec (needs pgvector 0.7+)
+-- mistral-embed vectors have 1024 dimensions; older setups declared
+-- VECTOR(768), which rejected every embedding, so existing values cannot be
+-- cast. They are cleared instead: run backfill_missing_embeddings afterwards
+-- to re-embed the history. The old vector index is dropped first and
+-- recreated below.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = 'speedtest_history'::regclass
+          AND attname = 'embedding'
+          AND (atttypid <> 'halfvec'::regtype OR atttypmod <> 1024)
+    ) THEN
+        DROP INDEX IF EXISTS speedtest_embedding_idx;
+        ALTER TABLE speedtest_history
+        ALTER COLUMN embedding TYPE halfvec(1024) USING NULL;
+    END IF;
+END $$;
+
+-- Migration: replace the old IVFFlat index with HNSW
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE indexname = 'speedtest_embedding_idx'
+          AND indexdef ILIKE '%ivfflat%'
+    ) THEN
+        DROP INDEX speedtest_embedding_idx;
+    END IF;
+END $$;
+
 -- Create index for vector similarity search
+-- HNSW keeps recall as rows are inserted (IVFFlat needs periodic REINDEX)
 CREATE INDEX IF NOT EXISTS speedtest_embedding_idx 
 ON speedtest_history 
-USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+USING hnsw (embedding halfvec_cosine_ops)
+WITH (m = {params['m']}, ef_construction = {params['ef_construction']});
+
+-- Query-time hnsw.ef_search is set on match_speedtest_history (get_rpc_function_sql)
 
 -- Create index for time-based queries
 CREATE INDEX IF NOT EXISTS idx_timestamp 
@@ -103,6 +307,20 @@ ON speedtest_history(timestamp DESC);
 -- Create index for ISP queries
 CREATE INDEX IF NOT EXISTS idx_isp 
 ON speedtest_history(isp);
+
+-- Migration: store chat test_context as jsonb (older setups used text)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'chat_history'
+          AND column_name = 'test_context'
+          AND data_type <> 'jsonb'
+    ) THEN
+        ALTER TABLE chat_history
+        ALTER COLUMN test_context TYPE jsonb USING test_context::jsonb;
+    END IF;
+END $$;
 """
     
     def save_test_result(self, test_data: Dict, embedding: Optional[List[float]] = None) -> bool:
@@ -111,58 +329,74 @@ ON speedtest_history(isp);
         
         Args:
             test_data: Dictionary containing test results
-            embedding: Optional vector embedding (768 dimensions)
+            embedding: Optional vector embedding (1024 dimensions, stored as halfvec)
             
         Returns:
             bool: True if save successful
         """
         try:
-            # Parse server info
-            server_info = test_data.get('server', 'Unknown')
-            server_name = server_info
-            server_country = ''
-            
-            if '(' in server_info and ')' in server_info:
-                parts = server_info.split('(')
-                server_name = parts[0].strip()
-                server_country = parts[1].replace(')', '').strip()
-            
-            # Prepare data
-            data = {
-                'timestamp': test_data.get('timestamp', datetime.now().isoformat()),
-                'ping_ms': float(test_data.get('ping', 0)),
-                'jitter_ms': float(test_data.get('jitter', 0)),
-                'download_mbps': float(test_data.get('download', 0)),
-                'upload_mbps': float(test_data.get('upload', 0)),
-                'server_name': server_name,
-                'server_country': server_country,
-                'isp': test_data.get('isp', 'Unknown'),
-                'client_ip': test_data.get('ip', 'Unknown')
-            }
-            
-            # Add embedding if provided
-            if embedding:
-                data['embedding'] = embedding
+            data = self._prepare_row(test_data, embedding)
             
             # Insert into Supabase
             result = self.client.table('speedtest_history').insert(data).execute()
-            print(f"✅ Saved test result to Supabase (ID: {result.data[0]['id']})")
+            logger.info("✅ Saved test result to Supabase (ID: %s)", result.data[0]['id'])
+            self.invalidate_cache('speedtest:')
             return True
             
-        except Exception as e:
-            print(f"❌ Error saving to Supabase: {e}")
+        except Exception:
+            logger.exception("❌ Error saving to Supabase")
             return False
     
-    def query_similar_tests(self, embedding: List[float], limit: int = 5) -> List[Dict]:
+    def _prepare_row(self, test_data: Dict, embedding: Optional[List[float]] = None) -> Dict:
+        """
+        Convert a test result to a speedtest_history row
+        
+        Args:
+            test_data: Dictionary containing test results
+            embedding: Optional vector embedding
+            
+        Returns:
+            Row dictionary ready for insert
+        """
+        # Parse server info: "Name (Country)"
+        server_info = test_data.get('server', 'Unknown')
+        match = _SERVER_RE.match(server_info)
+        if match:
+            server_name, server_country = match.group(1), match.group(2).strip()
+        else:
+            server_name, server_country = server_info, ''
+        
+        # Prepare data
+        data = {
+            'timestamp': test_data.get('timestamp', datetime.now().isoformat()),
+            'ping_ms': float(test_data.get('ping', 0)),
+            'jitter_ms': float(test_data.get('jitter', 0)),
+            'download_mbps': float(test_data.get('download', 0)),
+            'upload_mbps': float(test_data.get('upload', 0)),
+            'server_name': server_name,
+            'server_country': server_country,
+            'isp': test_data.get('isp', 'Unknown'),
+            'client_ip': test_data.get('ip', 'Unknown')
+        }
+        
+        # Add embedding if provided
+        if embedding:
+            data['embedding'] = _halfvec_literal(embedding)
+        
+        return data
+    
+    def query_similar_tests(self, embedding: List[float], limit: int = 5,
+                            match_threshold: float = 0.7) -> List[Dict]:
         """
         Find similar tests using vector similarity search
         
         Args:
-            embedding: Query vector (768 dimensions)
+            embedding: Query vector (1024 dimensions)
             limit: Number of results to return
+            match_threshold: Minimum similarity score (0-1)
             
         Returns:
-            List of similar test results
+            List of similar test results (empty if the search failed)
         """
         try:
             # Use RPC function for vector similarity search
@@ -171,6 +405,7 @@ ON speedtest_history(isp);
                 'match_speedtest_history',
                 {
                     'query_embedding': embedding,
+                    'match_threshold': match_threshold,
                     'match_count': limit
                 }
             ).execute()
@@ -178,19 +413,31 @@ ON speedtest_history(isp);
             return result.data if result.data else []
             
         except Exception as e:
-            print(f"⚠️ Vector search not available, using fallback: {e}")
-            # Fallback: get recent tests
-            return self.get_recent_tests(limit)
+            logger.warning("⚠️ Vector search not available: %s", e)
+            return []
     
-    def get_rpc_function_sql(self) -> str:
+    def get_rpc_function_sql(self, n: Optional[int] = None) -> str:
         """
         Returns SQL for creating the vector similarity search function
+        and the bulk embedding update function
         User should run this in Supabase SQL Editor
+        
+        Args:
+            n: Row count to tune hnsw.ef_search for (current count if connected)
         """
-        return """
+        if n is None:
+            n = self.get_total_count() if self.is_connected else 0
+        params = hnsw_params_for(n)
+        
+        return f"""
+-- Drop older signatures (VECTOR query, no threshold)
+DROP FUNCTION IF EXISTS match_speedtest_history(VECTOR, INT);
+DROP FUNCTION IF EXISTS match_speedtest_history(HALFVEC, INT);
+
 -- Create function for vector similarity search
 CREATE OR REPLACE FUNCTION match_speedtest_history(
-    query_embedding VECTOR(768),
+    query_embedding HALFVEC(1024),
+    match_threshold FLOAT DEFAULT 0.7,
     match_count INT DEFAULT 5
 )
 RETURNS TABLE (
@@ -201,11 +448,12 @@ RETURNS TABLE (
     download_mbps DECIMAL,
     upload_mbps DECIMAL,
     server_name VARCHAR,
-    server_country VARCHAR,
     isp VARCHAR,
     similarity FLOAT
 )
 LANGUAGE plpgsql
+-- Applies to every call, including PostgREST sessions (recall/speed trade-off)
+SET hnsw.ef_search = {params['ef_search']}
 AS $$
 BEGIN
     RETURN QUERY
@@ -217,43 +465,197 @@ BEGIN
         speedtest_history.download_mbps,
         speedtest_history.upload_mbps,
         speedtest_history.server_name,
-        speedtest_history.server_country,
         speedtest_history.isp,
         1 - (speedtest_history.embedding <=> query_embedding) AS similarity
     FROM speedtest_history
     WHERE speedtest_history.embedding IS NOT NULL
+      AND 1 - (speedtest_history.embedding <=> query_embedding) > match_threshold
+    -- Order by the bare distance operator so the HNSW index is used
     ORDER BY speedtest_history.embedding <=> query_embedding
     LIMIT match_count;
 END;
 $$;
+
+-- Create function for writing many embeddings in one statement
+-- (embeddings are halfvec text literals, matched to ids by position)
+CREATE OR REPLACE FUNCTION update_speedtest_embeddings(
+    ids BIGINT[],
+    embeddings TEXT[]
+)
+RETURNS INT
+LANGUAGE sql
+AS $$
+    WITH updated AS (
+        UPDATE speedtest_history h
+        SET embedding = u.e::HALFVEC(1024)
+        FROM unnest(ids, embeddings) AS u(id, e)
+        WHERE h.id = u.id
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INT FROM updated;
+$$;
+"""
+    
+    def get_stats_sql(self) -> str:
+        """
+        Returns SQL for creating the statistics aggregate functions
+        User should run this in Supabase SQL Editor
+        """
+        return """
+-- Create function for aggregate speedtest statistics
+CREATE OR REPLACE FUNCTION speedtest_stats()
+RETURNS TABLE (
+    count BIGINT,
+    avg_ping NUMERIC,
+    avg_jitter NUMERIC,
+    avg_download NUMERIC,
+    avg_upload NUMERIC,
+    max_download NUMERIC,
+    max_upload NUMERIC,
+    min_ping NUMERIC
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        COUNT(*),
+        AVG(ping_ms),
+        AVG(jitter_ms),
+        AVG(download_mbps),
+        AVG(upload_mbps),
+        MAX(download_mbps),
+        MAX(upload_mbps),
+        MIN(ping_ms)
+    FROM speedtest_history;
+$$;
+
+-- Create function for chat usage statistics
+CREATE OR REPLACE FUNCTION chat_stats()
+RETURNS TABLE (
+    total_chats BIGINT,
+    unique_users BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT COUNT(*), COUNT(DISTINCT user_ip)
+    FROM chat_history;
+$$;
 """
     
-    def get_recent_tests(self, limit: int = 10) -> List[Dict]:
+    @_ttl_cached('speedtest:recent:{limit}:{columns}')
+    def get_recent_tests(self, limit: int = 10, columns: str = _RECENT_COLS) -> List[Dict]:
         """
         Get most recent test results
         
         Args:
             limit: Number of results to return
+            columns: Columns to select (embedding is left out unless asked for)
             
         Returns:
             List of recent test results
         """
         try:
             result = self.client.table('speedtest_history')\
-                .select('*')\
+                .select(columns)\
                 .order('timestamp', desc=True)\
                 .limit(limit)\
                 .execute()
             
             return result.data if result.data else []
             
-        except Exception as e:
-            print(f"❌ Error fetching recent tests: {e}")
+        except Exception:
+            logger.exception("❌ Error fetching recent tests")
+            return []
+    
+    def get_tests_without_embedding(self, limit: int = 1000) -> List[Dict]:
+        """
+        Get test results that have no embedding yet (for backfilling)
+        
+        Args:
+            limit: Maximum number of rows to return
+            
+        Returns:
+            List of test results without embedding
+        """
+        try:
+            result = self.client.table('speedtest_history')\
+                .select(_BACKFILL_COLS)\
+                .is_('embedding', 'null')\
+                .order('timestamp', desc=False)\
+                .limit(limit)\
+                .execute()
+            
+            return result.data if result.data else []
+            
+        except Exception:
+            logger.exception("❌ Error fetching tests without embedding")
             return []
     
+    def bulk_update_embeddings(self, ids: List[int], embeddings: List[List[float]]) -> int:
+        """
+        Store embeddings for existing test results
+        One update_speedtest_embeddings RPC call writes the whole list;
+        falls back to one UPDATE per row if the function is not installed
+        
+        Args:
+            ids: Row IDs of the test results
+            embeddings: Embedding for each ID (same order)
+            
+        Returns:
+            int: Number of rows updated
+        """
+        literals = [_halfvec_literal(embedding) for embedding in embeddings]
+        try:
+            result = self.client.rpc('update_speedtest_embeddings', {
+                'ids': list(ids),
+                'embeddings': literals
+            }).execute()
+            updated = result.data or 0
+        except Exception as e:
+            logger.warning("⚠️ update_speedtest_embeddings RPC unavailable, updating row by row: %s", e)
+            updated = 0
+            for test_id, literal in zip(ids, literals):
+                try:
+                    self.client.table('speedtest_history')\
+                        .update({'embedding': literal})\
+                        .eq('id', test_id)\
+                        .execute()
+                    updated += 1
+                except Exception as e:
+                    logger.warning("⚠️ Error updating embedding for test %s: %s", test_id, e)
+        
+        if updated:
+            self.invalidate_cache('speedtest:')
+        return updated
+    
+    @_ttl_cached('speedtest:stats')
     def get_statistics(self) -> Dict:
         """
         Calculate aggregate statistics from history
+        Aggregation runs in Postgres (speedtest_stats RPC) when available
+        
+        Returns:
+            Dictionary with statistics
+        """
+        try:
+            result = self.client.rpc('speedtest_stats', {}).execute()
+            row = result.data[0] if result.data else {}
+            
+            if not row.get('count'):
+                return dict(EMPTY_STATISTICS)
+            
+            stats = {'count': int(row['count'])}
+            for key in STATISTICS_KEYS:
+                stats[key] = float(row[key])
+            
+            return stats
+            
+        except Exception as e:
+            logger.warning("⚠️ Stats RPC not available, computing locally: %s", e)
+            return self._compute_statistics()
+    
+    def _compute_statistics(self) -> Dict:
+        """
+        Calculate aggregate statistics in Python (fallback when RPC is missing)
         
         Returns:
             Dictionary with statistics
@@ -261,98 +663,280 @@ $$;
         try:
             # Get all data for statistics
             result = self.client.table('speedtest_history')\
-                .select('ping_ms, jitter_ms, download_mbps, upload_mbps')\
+                .select(_STATS_COLS)\
                 .execute()
             
             if not result.data:
-                return {
-                    'count': 0,
-                    'avg_ping': 0,
-                    'avg_jitter': 0,
-                    'avg_download': 0,
-                    'avg_upload': 0
-                }
+                return dict(EMPTY_STATISTICS)
             
             data = result.data
             count = len(data)
             
+            # (N, 4) array of ping, jitter, download, upload; rows are pulled by a
+            # C itemgetter and NumPy does the float conversion and reductions
+            arr = np.fromiter(
+                map(_STATS_FIELDS, data),
+                dtype=np.dtype((np.float64, 4)),
+                count=count
+            )
+            means = arr.mean(axis=0)
+            maxs = arr.max(axis=0)
+            
             stats = {
                 'count': count,
-                'avg_ping': sum(float(d['ping_ms']) for d in data) / count,
-                'avg_jitter': sum(float(d['jitter_ms']) for d in data) / count,
-                'avg_download': sum(float(d['download_mbps']) for d in data) / count,
-                'avg_upload': sum(float(d['upload_mbps']) for d in data) / count,
-                'max_download': max(float(d['download_mbps']) for d in data),
-                'max_upload': max(float(d['upload_mbps']) for d in data),
-                'min_ping': min(float(d['ping_ms']) for d in data)
+                'avg_ping': float(means[0]),
+                'avg_jitter': float(means[1]),
+                'avg_download': float(means[2]),
+                'avg_upload': float(means[3]),
+                'max_download': float(maxs[2]),
+                'max_upload': float(maxs[3]),
+                'min_ping': float(arr[:, 0].min())
             }
             
             return stats
             
-        except Exception as e:
-            print(f"❌ Error calculating statistics: {e}")
+        except Exception:
+            logger.exception("❌ Error calculating statistics")
             return {}
     
-    def migrate_csv_to_supabase(self, csv_path: str, embedding_generator=None) -> Tuple[int, int]:
+    def migrate_csv_to_supabase(self, csv_path: str, embedding_generator=None,
+                                batch_size: int = BATCH_SIZE,
+                                max_workers: int = EMBED_WORKERS,
+                                embed_batch=None) -> Tuple[int, int]:
         """
         Import existing history.csv data to Supabase
         
         Args:
             csv_path: Path to history.csv file
             embedding_generator: Function to generate embeddings (optional)
+            batch_size: Number of rows sent per insert request
+            max_workers: Parallel embedding_generator calls
+            embed_batch: Function embedding a list of texts at once, e.g.
+                         MistralRAGAnalyzer.generate_embeddings_batch (optional,
+                         used instead of embedding_generator when given)
             
         Returns:
             Tuple of (success_count, total_count)
         """
         if not os.path.exists(csv_path):
-            print(f"❌ CSV file not found: {csv_path}")
+            logger.error("❌ CSV file not found: %s", csv_path)
             return (0, 0)
         
+        # Per-row embedding calls are network-bound, so run them on a thread pool
+        per_row = embedding_generator and not embed_batch
+        executor = ThreadPoolExecutor(max_workers=max_workers) if per_row else None
+        # One direct Postgres connection for the whole import, if configured
+        direct = self._open_direct_ingest()
+        
         try:
             success_count = 0
             total_count = 0
+            pending = []
             
             with open(csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
+                reader = csv.reader(f)
+                header = next(reader, [])
+                
+                # Column positions, looked up once from the header row
+                missing = [name for name in CSV_HEADER if name not in header]
+                if missing:
+                    logger.error("❌ CSV is missing columns: %s", ', '.join(missing))
+                    return (0, 0)
+                fields = itemgetter(*(header.index(name) for name in CSV_HEADER))
                 
                 for row in reader:
                     total_count += 1
                     
+                    # Parse CSV row
                     try:
-                        # Parse CSV row
-                        test_data = {
-                            'timestamp': row.get('Waktu', ''),
-                            'ping': row.get('Ping (ms)', 0),
-                            'jitter': row.get('Jitter (ms)', 0),
-                            'download': row.get('Download (Mbps)', 0),
-                            'upload': row.get('Upload (Mbps)', 0),
-                            'server': row.get('Server', 'Unknown'),
-                            'isp': row.get('ISP', 'Unknown')
-                        }
-                        
-                        # Generate embedding if function provided
-                        embedding = None
-                        if embedding_generator:
-                            try:
-                                text = self.create_test_description(test_data)
-                                embedding = embedding_generator(text)
-                            except Exception as e:
-                                print(f"⚠️ Embedding generation failed for row {total_count}: {e}")
-                        
-                        # Save to Supabase
-                        if self.save_test_result(test_data, embedding):
-                            success_count += 1
-                            
-                    except Exception as e:
-                        print(f"⚠️ Error processing row {total_count}: {e}")
+                        timestamp, ping, jitter, download, upload, server, isp = fields(row)
+                    except IndexError:
+                        logger.warning("⚠️ Error processing row %d: too few columns", total_count)
                         continue
+                    
+                    pending.append((total_count, {
+                        'timestamp': timestamp,
+                        'ping': ping,
+                        'jitter': jitter,
+                        'download': download,
+                        'upload': upload,
+                        'server': server,
+                        'isp': isp
+                    }))
+                    
+                    if len(pending) >= batch_size:
+                        batch = self._prepare_batch(pending, embedding_generator, executor, embed_batch)
+                        success_count += self._insert_batch(batch, direct)
+                        pending = []
+            
+            # Flush the final partial batch
+            if pending:
+                batch = self._prepare_batch(pending, embedding_generator, executor, embed_batch)
+                success_count += self._insert_batch(batch, direct)
             
-            print(f"✅ Migration complete: {success_count}/{total_count} records imported")
+            if success_count:
+                self.invalidate_cache('speedtest:')
+            
+            logger.info("✅ Migration complete: %d/%d records imported", success_count, total_count)
             return (success_count, total_count)
             
-        except Exception as e:
-            print(f"❌ Migration error: {e}")
+        except Exception:
+            logger.exception("❌ Migration error")
             return (0, 0)
+        
+        finally:
+            if executor:
+                executor.shutdown()
+            if direct:
+                self._close_direct_ingest(direct)
+    
+    def _prepare_batch(self, pending: List[Tuple[int, Dict]], embedding_generator=None,
+                       executor: Optional[ThreadPoolExecutor] = None,
+                       embed_batch=None) -> List[Dict]:
+        """
+        Turn parsed CSV rows into insertable rows with their embeddings
+        embed_batch is called once for the whole batch; otherwise
+        embedding_generator is called per row in parallel on executor
+        
+        Args:
+            pending: (row number, test_data) pairs
+            embedding_generator: Function to generate embeddings (optional)
+            executor: Pool the embedding_generator calls run on
+            embed_batch: Function embedding a list of texts at once (optional)
+            
+        Returns:
+            List of prepared rows (rows that fail to parse are skipped)
+        """
+        def embed(item):
+            row_number, test_data = item
+            try:
+                return embedding_generator(self.create_test_description(test_data))
+            except Exception as e:
+                logger.warning("⚠️ Embedding generation failed for row %d: %s", row_number, e)
+                return None
+        
+        embeddings = None
+        if embed_batch:
+            try:
+                embeddings = embed_batch([self.create_test_description(test_data)
+                                          for _, test_data in pending])
+            except Exception as e:
+                logger.warning("⚠️ Embedding generation failed for rows %d-%d: %s",
+                               pending[0][0], pending[-1][0], e)
+            if embeddings is not None and len(embeddings) != len(pending):
+                logger.warning("⚠️ Got %d embeddings for %d rows, skipping them",
+                               len(embeddings), len(pending))
+                embeddings = None
+        elif embedding_generator:
+            # map keeps the input order
+            embeddings = executor.map(embed, pending)
+        
+        if embeddings is None:
+            embeddings = [None] * len(pending)
+        
+        batch = []
+        for (row_number, test_data), embedding in zip(pending, embeddings):
+            try:
+                batch.append(self._prepare_row(test_data, embedding))
+            except Exception as e:
+                logger.warning("⚠️ Error processing row %d: %s", row_number, e)
+        
+        return batch
+    
+    def _insert_batch(self, rows: List[Dict],
+                      direct: Optional[Tuple[asyncio.AbstractEventLoop, object]] = None) -> int:
+        """
+        Insert many speedtest_history rows in a single request
+        Falls back to row-by-row inserts if the batch fails, so one bad row
+        does not lose the whole batch
+        
+        Args:
+            rows: Prepared rows (see _prepare_row)
+            direct: (event loop, asyncpg connection) from _open_direct_ingest
+            
+        Returns:
+            int: Number of rows inserted
+        """
+        if direct:
+            loop, conn = direct
+            try:
+                return loop.run_until_complete(self._copy_rows(conn, rows))
+            except Exception as e:
+                logger.warning("⚠️ Direct Postgres insert failed, using REST: %s", e)
+        
+        try:
+            result = self.client.table('speedtest_history').insert(rows).execute()
+            return len(result.data)
+        except Exception as e:
+            logger.warning("⚠️ Batch insert failed, retrying row by row: %s", e)
+        
+        inserted = 0
+        for row in rows:
+            try:
+                self.client.table('speedtest_history').insert(row).execute()
+                inserted += 1
+            except Exception as e:
+                logger.warning("⚠️ Error inserting row (%s): %s", row.get('timestamp'), e)
+        
+        return inserted
+    
+    def _open_direct_ingest(self) -> Optional[Tuple[asyncio.AbstractEventLoop, object]]:
+        """
+        Connect to Postgres directly for a bulk import
+        
+        Returns:
+            (event loop, asyncpg connection), or None if asyncpg or
+            DATABASE_URL is missing or the connection fails
+        """
+        if not (self.database_url and asyncpg):
+            return None
+        
+        loop = asyncio.new_event_loop()
+        try:
+            conn = loop.run_until_complete(asyncpg.connect(self.database_url))
+            return loop, conn
+        except Exception as e:
+            logger.warning("⚠️ Direct Postgres connection failed, using REST: %s", e)
+            loop.close()
+            return None
+    
+    def _close_direct_ingest(self, direct: Tuple[asyncio.AbstractEventLoop, object]) -> None:
+        """Close the connection and event loop from _open_direct_ingest"""
+        loop, conn = direct
+        try:
+            loop.run_until_complete(conn.close())
+        except Exception as e:
+            logger.warning("⚠️ Error closing direct Postgres connection: %s", e)
+        finally:
+            loop.close()
+    
+    async def _copy_rows(self, conn, rows: List[Dict]) -> int:
+        """
+        Insert prepared rows with a single COPY over a direct Postgres connection
+        Bypasses PostgREST for the bulk import path
+        
+        Args:
+            conn: asyncpg connection
+            rows: Prepared rows (see _prepare_row)
+            
+        Returns:
+            int: Number of rows inserted
+        """
+        # CSV text COPY lets Postgres parse timestamps, decimals and halfvec literals
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            tuple(row.get(col) for col in _INSERT_COLS) for row in rows
+        )
+        
+        await conn.copy_to_table(
+            'speedtest_history',
+            source=io.BytesIO(buffer.getvalue().encode('utf-8')),
+            columns=_INSERT_COLS,
+            format='csv',
+            force_not_null=_TEXT_COLS
+        )
+        
+        return len(rows)
     
     def create_test_description(self, test_data: Dict) -> str:
         """
@@ -372,66 +956,112 @@ $$;
 - Download Speed: {test_data.get('download', 0)} Mbps
 - Upload Speed: {test_data.get('upload', 0)} Mbps"""
     
-    def sync_to_csv(self, csv_path: str) -> bool:
+    def sync_to_csv(self, csv_path: str, page_size: int = EXPORT_PAGE_SIZE) -> bool:
         """
         Export Supabase data back to CSV for backup
+        Rows are fetched and written one page at a time into a temporary
+        file, which replaces csv_path only once the export is complete
         
         Args:
             csv_path: Path to save CSV file
+            page_size: Number of rows fetched per request
             
         Returns:
             bool: True if export successful
         """
+        tmp_path = csv_path + '.tmp'
         try:
-            # Get all data
-            result = self.client.table('speedtest_history')\
-                .select('timestamp, ping_ms, jitter_ms, download_mbps, upload_mbps, server_name, server_country, isp')\
-                .order('timestamp', desc=False)\
-                .execute()
+            page = self._fetch_export_page(None, page_size)
             
-            if not result.data:
-                print("⚠️ No data to export")
+            if not page:
+                logger.warning("⚠️ No data to export")
                 return False
             
+            exported = 0
+            
             # Write to CSV
-            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 
                 # Header
-                writer.writerow([
-                    'Waktu', 'Ping (ms)', 'Jitter (ms)', 
-                    'Download (Mbps)', 'Upload (Mbps)', 
-                    'Server', 'ISP'
-                ])
+                writer.writerow(CSV_HEADER)
                 
-                # Data rows
-                for row in result.data:
-                    server = row['server_name']
-                    if row.get('server_country'):
-                        server += f" ({row['server_country']})"
+                while page:
+                    # Data rows
+                    writer.writerows(self._export_rows(page))
+                    exported += len(page)
                     
-                    writer.writerow([
-                        row['timestamp'],
-                        row['ping_ms'],
-                        row['jitter_ms'],
-                        row['download_mbps'],
-                        row['upload_mbps'],
-                        server,
-                        row['isp']
-                    ])
-            
-            print(f"✅ Exported {len(result.data)} records to {csv_path}")
+                    if len(page) < page_size:
+                        break
+                    last = page[-1]
+                    page = self._fetch_export_page((last['timestamp'], last['id']), page_size)
+            
+            os.replace(tmp_path, csv_path)
+            logger.info("✅ Exported %d records to %s", exported, csv_path)
             return True
             
-        except Exception as e:
-            print(f"❌ Export error: {e}")
+        except Exception:
+            logger.exception("❌ Export error")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
             return False
     
+    @staticmethod
+    def _export_rows(page: List[Dict]) -> Iterator[Tuple]:
+        """Yield CSV rows for one export page"""
+        for row in page:
+            server = row['server_name']
+            if row['server_country']:
+                server += f" ({row['server_country']})"
+            
+            yield (
+                row['timestamp'],
+                row['ping_ms'],
+                row['jitter_ms'],
+                row['download_mbps'],
+                row['upload_mbps'],
+                server,
+                row['isp']
+            )
+    
+    def _fetch_export_page(self, after: Optional[Tuple[str, int]], page_size: int) -> List[Dict]:
+        """
+        Fetch one page of history rows for CSV export
+        Keyset pagination: rows after (timestamp, id) of the previous page,
+        so pages stay consistent while rows are inserted
+        
+        Args:
+            after: (timestamp, id) of the last exported row, None for the first page
+            page_size: Number of rows to fetch
+            
+        Returns:
+            List of rows ordered by timestamp (id breaks ties)
+        """
+        query = self.client.table('speedtest_history').select(_EXPORT_COLS)
+        if after is not None:
+            last_ts, last_id = after
+            query = query.or_(
+                f'timestamp.gt."{last_ts}",'
+                f'and(timestamp.eq."{last_ts}",id.gt.{last_id})'
+            )
+        
+        result = query\
+            .order('timestamp', desc=False)\
+            .order('id', desc=False)\
+            .limit(page_size)\
+            .execute()
+        
+        return result.data if result.data else []
+    
+    @_ttl_cached('speedtest:count')
     def get_total_count(self) -> int:
         """Get total number of tests in database"""
         try:
+            # head=True: only the count header is returned, no row data
             result = self.client.table('speedtest_history')\
-                .select('id', count='exact')\
+                .select('id', count='exact', head=True)\
                 .execute()
             return result.count if result.count else 0
         except:
@@ -468,17 +1098,19 @@ $$;
                 data['session_id'] = session_id
             
             if test_context:
-                data['test_context'] = json.dumps(test_context)
+                # Stored as jsonb; postgrest serializes the dict
+                data['test_context'] = test_context
             
             if embedding:
                 data['embedding'] = embedding
             
             result = self.client.table('chat_history').insert(data).execute()
-            print(f"✅ Saved chat to Supabase (ID: {result.data[0]['id']})")
+            logger.info("✅ Saved chat to Supabase (ID: %s)", result.data[0]['id'])
+            self.invalidate_cache('chat:')
             return True
             
-        except Exception as e:
-            print(f"❌ Error saving chat: {e}")
+        except Exception:
+            logger.exception("❌ Error saving chat")
             return False
     
     def get_user_chat_history(self, user_ip: str, limit: int = 10) -> List[Dict]:
@@ -502,8 +1134,8 @@ $$;
             
             return result.data if result.data else []
             
-        except Exception as e:
-            print(f"❌ Error fetching chat history: {e}")
+        except Exception:
+            logger.exception("❌ Error fetching chat history")
             return []
     
     def search_similar_chats(self, query_embedding: List[float], 
@@ -533,42 +1165,65 @@ $$;
             return result.data if result.data else []
             
         except Exception as e:
-            print(f"⚠️ Chat vector search not available: {e}")
+            logger.warning("⚠️ Chat vector search not available: %s", e)
             return []
     
-    def get_all_chat_history(self, limit: int = 50) -> List[Dict]:
+    @_ttl_cached('chat:all:{limit}:{columns}')
+    def get_all_chat_history(self, limit: int = 50, columns: str = _CHAT_COLS) -> List[Dict]:
         """
         Get all recent chat history (for analytics)
         
         Args:
             limit: Number of recent chats to return
+            columns: Columns to select (embedding is left out unless asked for)
             
         Returns:
             List of all chat messages
         """
         try:
             result = self.client.table('chat_history')\
-                .select('*')\
+                .select(columns)\
                 .order('timestamp', desc=True)\
                 .limit(limit)\
                 .execute()
             
             return result.data if result.data else []
             
-        except Exception as e:
-            print(f"❌ Error fetching all chat history: {e}")
+        except Exception:
+            logger.exception("❌ Error fetching all chat history")
             return []
     
     def get_chat_statistics(self) -> Dict:
         """
         Get statistics about chat usage
+        Counting runs in Postgres (chat_stats RPC) when available
+        
+        Returns:
+            Dictionary with chat statistics
+        """
+        try:
+            result = self.client.rpc('chat_stats', {}).execute()
+            row = result.data[0] if result.data else {}
+            
+            return {
+                'total_chats': int(row.get('total_chats') or 0),
+                'unique_users': int(row.get('unique_users') or 0)
+            }
+            
+        except Exception as e:
+            logger.warning("⚠️ Chat stats RPC not available, computing locally: %s", e)
+            return self._compute_chat_statistics()
+    
+    def _compute_chat_statistics(self) -> Dict:
+        """
+        Get chat statistics in Python (fallback when RPC is missing)
         
         Returns:
             Dictionary with chat statistics
         """
         try:
             result = self.client.table('chat_history')\
-                .select('id, user_ip, timestamp')\
+                .select('user_ip')\
                 .execute()
             
             if not result.data:
@@ -578,14 +1233,14 @@ $$;
                 }
             
             data = result.data
-            unique_ips = set(d['user_ip'] for d in data)
+            unique_ips = set(map(itemgetter('user_ip'), data))
             
             return {
                 'total_chats': len(data),
                 'unique_users': len(unique_ips)
             }
             
-        except Exception as e:
-            print(f"❌ Error getting chat statistics: {e}")
+        except Exception:
+            logger.exception("❌ Error getting chat statistics")
             return {}
 